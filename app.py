@@ -8,33 +8,91 @@ MinerU Web UI 应用程序
 """
 
 import os
+import io
+import re
+import json
 import time
-import shutil
+import uuid
 import zipfile
-import tempfile
+import threading
+import contextlib
+from functools import partial
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import gradio as gr
 import docx
-from PIL import Image
+import fitz
 from loguru import logger
 
+try:
+    import fcntl
+except ImportError:  # Windows下没有fcntl，缓存索引只在进程内加锁
+    fcntl = None
+
 # 导入MinerU相关模块
 import sys
 sys.path.append('..')
-from magic_pdf.data.data_reader_writer import FileBasedDataWriter, FileBasedDataReader
+from magic_pdf.data.data_reader_writer import FileBasedDataWriter
 from magic_pdf.data.dataset import PymuDocDataset
 from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
+try:
+    from magic_pdf.model.doc_analyze_by_custom_model import batch_doc_analyze
+except ImportError:  # MinerU 1.3之前没有批量推理接口，批量处理时逐个文件推理
+    batch_doc_analyze = None
 from magic_pdf.config.enums import SupportedPdfParseMethod
 
 # 导入自定义工具类
 from utils import ParallelProcessor, FileUtils, ProgressTracker
 
 
+# DOCX标题样式名称，如"Heading 1"、"Heading2"
+_HEADING_RE = re.compile(r'^Heading\s*(\d+)$')
+
+# 工作进程内缓存的转换器实例，按输出目录区分
+_worker_converters = {}
+
+# 模型推理只在主进程中进行（批量处理的工作进程只返回待OCR标记），
+# 并发的Web请求与批量推理共用该锁，避免同时推理导致显存超额
+_inference_lock = threading.Lock()
+
+
+def _env_int(name, default):
+    """
+    读取正整数类型的环境变量
+    
+    Args:
+        name: 环境变量名
+        default: 未设置或取值无效时的默认值
+        
+    Returns:
+        不小于1的整数
+    """
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return max(int(value), 1)
+    except ValueError:
+        logger.warning(f"环境变量{name}的值无效: {value!r}，使用默认值{default}")
+        return default
+
+
 class MinerUWebConverter:
     """MinerU文档转换Web界面控制器类"""
     
+    # 文本层平均每页字符数达到该阈值时，直接使用文本层生成Markdown，跳过OCR
+    TEXT_LAYER_MIN_CHARS_PER_PAGE = 100
+    
+    # 这些图片格式本身已经压缩，写入ZIP时直接存储，不再消耗CPU进行deflate
+    PRECOMPRESSED_IMAGE_EXTS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+    
+    # 缓存结果的格式版本，转换逻辑变化导致输出不同时递增，旧版本的缓存条目不再使用
+    CACHE_VERSION = 1
+    
+    # 批量处理时每次OCR推理合并的页数，可通过环境变量MINERU_BATCH_PAGES调整
+    BATCH_PAGES = _env_int("MINERU_BATCH_PAGES", 64)
+    
     def __init__(self, output_dir="output"):
         """
         初始化转换器
@@ -44,16 +102,181 @@ class MinerUWebConverter:
         """
         self.output_dir = output_dir
         FileUtils.ensure_dir(output_dir)
+        
+        # 按文件内容哈希缓存转换结果，相同文件再次上传时直接返回
+        self._cache_dir = FileUtils.ensure_dir(os.path.join(output_dir, ".cache"))
+        self._cache_index_path = os.path.join(self._cache_dir, "index.json")
+        self._cache_lock = threading.Lock()
+        self._cache = {}
+        self._cache_mtime_ns = None
+        self._reload_cache_index()
+        
+        # 文件扩展名 -> 处理方法
+        self._handlers = {
+            '.pdf': self._process_pdf,
+            '.doc': self._process_docx,
+            '.docx': self._process_docx,
+            '.jpg': self._process_image,
+            '.jpeg': self._process_image,
+            '.png': self._process_image,
+            '.gif': self._process_image,
+        }
+        
         self.processor = ParallelProcessor()
         logger.info(f"初始化MinerU Web转换器，输出目录: {output_dir}")
+    
+    def _load_cache_index(self):
+        """
+        从磁盘加载转换结果缓存索引
+        
+        Returns:
+            缓存索引字典 {文件哈希: {version, zip_path, md_path, mtime}}
+        """
+        if not os.path.exists(self._cache_index_path):
+            return {}
+        try:
+            with open(self._cache_index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取缓存索引失败，将重新建立: {e}")
+            return {}
+    
+    def _cache_lookup(self, file_hash, file_path):
+        """
+        查找缓存的转换结果
+        
+        缓存只按内容哈希匹配，相同内容可能以不同文件名上传，
+        因此返回结果中的文件名、ZIP路径均按本次上传的文件名确定。
+        
+        Args:
+            file_hash: 文件内容哈希
+            file_path: 本次上传的文件路径
+            
+        Returns:
+            命中时返回转换结果信息，否则返回None
+        """
+        with self._cache_lock:
+            entry = self._cache.get(file_hash)
+            # 未命中时检查索引是否被其他进程（如批量处理的工作进程）更新过
+            if entry is None and self._cache_index_mtime_ns() != self._cache_mtime_ns:
+                self._reload_cache_index()
+                entry = self._cache.get(file_hash)
+        if entry is None:
+            return None
+        
+        # 旧版本转换逻辑生成的结果、已被删除的结果都不再使用，顺便从索引中移除
+        md_path = entry["md_path"]
+        if entry.get("version") != self.CACHE_VERSION or not os.path.exists(md_path):
+            self._cache_discard(file_hash, entry)
+            return None
+        
+        # 按本次的文件名查找已打包的ZIP，不存在时由调用方重新打包
+        name_without_extension = os.path.basename(file_path).split('.')[0]
+        task_output_dir = os.path.dirname(md_path)
+        zip_path = os.path.join(task_output_dir, f"{name_without_extension}.zip")
+        if not os.path.exists(zip_path):
+            zip_path = None
+        
+        with open(md_path, 'r', encoding='utf-8') as f:
+            md_content = f.read()
+        return {
+            "name": name_without_extension,
+            "md_content": md_content,
+            "zip_path": zip_path,
+            "md_file_path": md_path,
+            "image_dir": os.path.join(task_output_dir, "images")
+        }
+    
+    def _cache_store(self, file_hash, result):
+        """
+        记录转换结果并原子地更新磁盘上的缓存索引
+        
+        读取、合并、写回索引的整个过程持有文件锁，多个进程同时写入时不会丢失条目。
+        
+        Args:
+            file_hash: 文件内容哈希
+            result: 转换结果信息
+        """
+        entry = {
+            "version": self.CACHE_VERSION,
+            "zip_path": result["zip_path"],
+            "md_path": result["md_file_path"],
+            "mtime": time.time()
+        }
+        with self._cache_lock, self._cache_file_lock():
+            # 持有文件锁后以磁盘上的索引为准，失效的条目在查找时再清理
+            cache = self._load_cache_index()
+            cache[file_hash] = entry
+            self._write_cache_index(cache)
+    
+    def _cache_discard(self, file_hash, entry):
+        """
+        从缓存索引中移除失效的条目
         
-    def _process_pdf(self, file_path, task_id):
+        Args:
+            file_hash: 文件内容哈希
+            entry: 查找时读到的条目，磁盘上的条目已被其他进程更新时不移除
+        """
+        with self._cache_lock, self._cache_file_lock():
+            cache = self._load_cache_index()
+            if cache.get(file_hash) != entry:
+                return
+            del cache[file_hash]
+            self._write_cache_index(cache)
+    
+    def _write_cache_index(self, cache):
+        """
+        原子地写入缓存索引，调用方需持有self._cache_lock和缓存索引文件锁
+        
+        Args:
+            cache: 缓存索引字典
+        """
+        tmp_path = f"{self._cache_index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, self._cache_index_path)
+        
+        self._cache = cache
+        self._cache_mtime_ns = self._cache_index_mtime_ns()
+    
+    @contextlib.contextmanager
+    def _cache_file_lock(self):
+        """跨进程的缓存索引文件锁"""
+        with open(f"{self._cache_index_path}.lock", 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    
+    def _cache_index_mtime_ns(self):
+        """
+        获取缓存索引文件的修改时间
+        
+        Returns:
+            修改时间（纳秒），索引文件不存在时返回None
+        """
+        try:
+            return os.stat(self._cache_index_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def _reload_cache_index(self):
+        """从磁盘重新加载缓存索引，调用方需持有self._cache_lock（初始化时除外）"""
+        self._cache_mtime_ns = self._cache_index_mtime_ns()
+        self._cache = self._load_cache_index()
+    
+    def _process_pdf(self, file_path, task_id, make_zip=True, defer_ocr=False):
         """
         处理PDF文件
         
         Args:
             file_path: PDF文件路径
             task_id: 任务ID
+            make_zip: 是否生成单文件ZIP压缩包，批量处理时为False
+            defer_ocr: 需要OCR时不立即推理，而是返回待OCR标记，由批量处理统一推理
             
         Returns:
             转换结果信息，包含Markdown文本和图片路径
@@ -66,58 +289,133 @@ class MinerUWebConverter:
         local_image_dir = os.path.join(task_output_dir, "images")
         FileUtils.ensure_dir(local_image_dir)
         
-        image_writer = FileBasedDataWriter(local_image_dir)
-        md_writer = FileBasedDataWriter(task_output_dir)
-        
         # 读取PDF内容
-        reader = FileBasedDataReader("")
-        pdf_bytes = reader.read(file_path)
-        
-        # 创建数据集实例
-        ds = PymuDocDataset(pdf_bytes)
-        
-        # 根据文档类型选择处理方式
-        if ds.classify() == SupportedPdfParseMethod.OCR:
-            infer_result = ds.apply(doc_analyze, ocr=True)
-            pipe_result = infer_result.pipe_ocr_mode(image_writer)
-        else:
-            infer_result = ds.apply(doc_analyze, ocr=False)
-            pipe_result = infer_result.pipe_txt_mode(image_writer)
-        
-        # 获取Markdown内容
-        image_dir = "images"
-        md_content = pipe_result.get_markdown(image_dir)
-        
-        # 保存Markdown文件
+        pdf_bytes = FileUtils.read_bytes(file_path)
         md_file_path = os.path.join(task_output_dir, f"{name_without_extension}.md")
-        pipe_result.dump_md(md_writer, f"{name_without_extension}.md", image_dir)
         
-        # 创建ZIP压缩包
-        zip_path = os.path.join(task_output_dir, f"{name_without_extension}.zip")
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            # 添加Markdown文件
-            zipf.write(md_file_path, os.path.basename(md_file_path))
+        with fitz.open("pdf", pdf_bytes) as pdf_doc:
+            # 先尝试直接读取文本层，原生数字PDF无需OCR
+            page_blocks = self._read_pdf_text_layer(pdf_doc)
+            text_chars = sum(len(block) for blocks in page_blocks for block in blocks)
+            use_text_layer = text_chars >= self.TEXT_LAYER_MIN_CHARS_PER_PAGE * max(len(page_blocks), 1)
+            # 只要有一页没有文本（封面图、空白页、扫描页等），文本层就无法覆盖整个文档，
+            # 交给模型解析，避免丢失这些页面
+            has_textless_page = not all(page_blocks)
+            
+            # 模型解析方式，为None时尚未分类
+            ds = None
+            parse_method = None
+            if has_textless_page:
+                use_text_layer = False
+            elif not use_text_layer:
+                # 创建数据集实例
+                ds = PymuDocDataset(pdf_bytes)
+                # 文本型PDF同样直接使用文本层，只有扫描件才需要模型推理
+                parse_method = ds.classify()
+                use_text_layer = parse_method == SupportedPdfParseMethod.TXT
             
-            # 添加图片文件夹
-            for img_file in os.listdir(local_image_dir):
-                img_path = os.path.join(local_image_dir, img_file)
-                if os.path.isfile(img_path):
-                    zipf.write(img_path, os.path.join("images", img_file))
+            if use_text_layer:
+                logger.info(f"使用PDF文本层生成Markdown: {file_path}")
+                md_content = self._build_text_layer_markdown(pdf_doc, page_blocks, local_image_dir)
+                with open(md_file_path, 'w', encoding='utf-8') as f:
+                    f.write(md_content)
         
-        return {
+        if not use_text_layer:
+            if defer_ocr:
+                # 尚未分类的文档由批量推理时创建的数据集实例分类，工作进程中不再重复创建
+                return {"ocr_pending": True, "file_path": file_path, "task_id": task_id,
+                        "parse_method": parse_method, "fallback_image": None}
+            
+            if ds is None:
+                ds = PymuDocDataset(pdf_bytes)
+                parse_method = ds.classify()
+            
+            # 根据文档类型选择处理方式，文本型PDF无需OCR
+            with _inference_lock:
+                infer_result = ds.apply(doc_analyze, ocr=parse_method == SupportedPdfParseMethod.OCR)
+            return self._finish_ocr(infer_result, file_path, task_id, make_zip,
+                                    parse_method=parse_method)
+        
+        result = {
+            "name": name_without_extension,
             "md_content": md_content,
-            "zip_path": zip_path,
+            "zip_path": None,
             "md_file_path": md_file_path,
             "image_dir": local_image_dir
         }
+        
+        # 创建ZIP压缩包
+        if make_zip:
+            self._write_zip(result)
+        
+        return result
+    
+    def _read_pdf_text_layer(self, pdf_doc):
+        """
+        读取PDF每一页文本层中的文本块
+        
+        Args:
+            pdf_doc: 已打开的fitz文档对象
+            
+        Returns:
+            每页的文本块列表，没有文本的页面对应空列表
+        """
+        page_blocks = []
+        for page in pdf_doc:
+            # 文本块格式: (x0, y0, x1, y1, text, block_no, block_type)，block_type为0表示文本
+            # sort=True按阅读顺序排列文本块，多栏页面不会错乱
+            blocks = [block[4].strip() for block in page.get_text("blocks", sort=True) if block[6] == 0]
+            page_blocks.append([text for text in blocks if text])
+        return page_blocks
     
-    def _process_docx(self, file_path, task_id):
+    def _build_text_layer_markdown(self, pdf_doc, page_blocks, local_image_dir):
+        """
+        根据PDF文本层生成Markdown，并导出页面中嵌入的图片
+        
+        Args:
+            pdf_doc: 已打开的fitz文档对象
+            page_blocks: _read_pdf_text_layer返回的每页文本块
+            local_image_dir: 图片保存目录
+            
+        Returns:
+            Markdown文本
+        """
+        md_content = []
+        image_index = 1
+        # 图片xref -> 已导出的图片链接，每页重复出现的图片（如页眉logo）只导出一次
+        seen_xrefs = {}
+        
+        # 调用方保证每一页都有文本块，没有文本的文档已交给OCR处理
+        for page, blocks in zip(pdf_doc, page_blocks):
+            md_content.extend(blocks)
+            
+            for img in page.get_images(full=True):
+                xref = img[0]
+                if xref in seen_xrefs:
+                    md_content.append(seen_xrefs[xref])
+                    continue
+                
+                extracted = pdf_doc.extract_image(xref)
+                if not extracted:
+                    continue
+                image_name = f"image_{image_index}.{extracted['ext']}"
+                with open(os.path.join(local_image_dir, image_name), 'wb') as f:
+                    f.write(extracted["image"])
+                seen_xrefs[xref] = f"![图片 {image_index}](images/{image_name})"
+                md_content.append(seen_xrefs[xref])
+                image_index += 1
+        
+        return '\n\n'.join(md_content)
+    
+    def _process_docx(self, file_path, task_id, make_zip=True, defer_ocr=False):
         """
         处理DOCX文件
         
         Args:
             file_path: DOCX文件路径
             task_id: 任务ID
+            make_zip: 是否生成单文件ZIP压缩包，批量处理时为False
+            defer_ocr: DOCX无需OCR，仅为与其他处理方法保持相同的参数
             
         Returns:
             转换结果信息
@@ -133,104 +431,157 @@ class MinerUWebConverter:
         # 读取DOCX文件
         doc = docx.Document(file_path)
         
-        # 提取文本和图片
-        md_content = []
+        # 提取文本和图片，Markdown直接写入缓冲区，每个块之后跟一个空行
+        buf = io.StringIO()
         image_index = 1
+        # 段落样式ID -> 标题级别（0表示非标题），文档中的段落大量复用同一样式
+        heading_levels = {}
+        # 待写入的图片 (保存路径, 图片数据)，及其在Markdown中对应的链接
+        image_blobs = []
+        image_links = []
         
         # 处理段落和图片
         for para in doc.paragraphs:
             # 处理段落文本
-            if para.text.strip():
-                # 获取段落级别（如果是标题）
-                if para.style.name.startswith('Heading'):
-                    heading_level = int(para.style.name.replace('Heading', ''))
-                    md_content.append(f"{'#' * heading_level} {para.text}")
+            text = para.text
+            if text.strip():
+                # 获取段落级别（如果是标题），按样式ID缓存以避免重复解析样式XML
+                style_id = para._p.style
+                heading_level = heading_levels.get(style_id)
+                if heading_level is None:
+                    match = _HEADING_RE.match(para.style.name or '')
+                    heading_level = int(match.group(1)) if match else 0
+                    heading_levels[style_id] = heading_level
+                
+                if heading_level:
+                    buf.write(f"{'#' * heading_level} {text}\n\n")
                 else:
-                    md_content.append(para.text)
+                    buf.write(f"{text}\n\n")
             
-            # 处理段落中的图片（如果有）
+            # 处理段落中的图片（如果有），先收集图片数据，段落遍历结束后统一写盘
             for run in para.runs:
                 for shape in run._element.drawing_lst:
-                    # 保存图片
-                    image_path = os.path.join(local_image_dir, f"image_{image_index}.png")
+                    image_part = self._get_docx_image_part(para.part, shape)
+                    if image_part is None:
+                        continue
                     
-                    # 提取并保存图片
-                    if self._extract_and_save_docx_image(shape, image_path):
-                        md_content.append(f"![图片 {image_index}](images/image_{image_index}.png)")
-                        image_index += 1
+                    image_name = f"image_{image_index}.{image_part.partname.ext}"
+                    image_link = f"![图片 {image_index}](images/{image_name})\n\n"
+                    image_blobs.append((os.path.join(local_image_dir, image_name), image_part.blob))
+                    image_links.append(image_link)
+                    buf.write(image_link)
+                    image_index += 1
+        
+        # 并行写入图片文件（I/O密集型，使用线程池），记录保存失败的图片
+        failed_links = []
+        if image_blobs:
+            with ThreadPoolExecutor(max_workers=min(8, len(image_blobs))) as executor:
+                saved = list(executor.map(self._write_image_blob, image_blobs))
+            failed_links = [link for link, ok in zip(image_links, saved) if not ok]
+            image_blobs = [item for item, ok in zip(image_blobs, saved) if ok]
         
         # 处理表格
         for table in doc.tables:
-            table_md = []
             # 获取表头
             header_row = table.rows[0]
             header_cells = [cell.text.strip() for cell in header_row.cells]
             
             # 表格标记开始
-            table_md.append('| ' + ' | '.join(header_cells) + ' |')
-            table_md.append('| ' + ' | '.join(['---'] * len(header_cells)) + ' |')
+            buf.write(f"| {' | '.join(header_cells)} |\n")
+            buf.write('|' + ' --- |' * len(header_cells))
             
             # 获取表格数据行
             for row in table.rows[1:]:
                 cells = [cell.text.strip() for cell in row.cells]
-                table_md.append('| ' + ' | '.join(cells) + ' |')
+                buf.write(f"\n| {' | '.join(cells)} |")
             
-            md_content.append('\n'.join(table_md))
+            buf.write('\n\n')
         
         # 合并Markdown内容
-        full_md_content = '\n\n'.join(md_content)
+        full_md_content = buf.getvalue()
+        buf.close()
+        
+        # 移除保存失败的图片链接（每个链接的图片序号唯一），避免Markdown引用不存在的文件
+        for image_link in failed_links:
+            full_md_content = full_md_content.replace(image_link, "", 1)
         
         # 保存Markdown文件
         md_file_path = os.path.join(task_output_dir, f"{name_without_extension}.md")
         with open(md_file_path, 'w', encoding='utf-8') as f:
             f.write(full_md_content)
         
-        # 创建ZIP压缩包
-        zip_path = os.path.join(task_output_dir, f"{name_without_extension}.zip")
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            # 添加Markdown文件
-            zipf.write(md_file_path, os.path.basename(md_file_path))
-            
-            # 添加图片文件夹
-            for img_file in os.listdir(local_image_dir):
-                img_path = os.path.join(local_image_dir, img_file)
-                if os.path.isfile(img_path):
-                    zipf.write(img_path, os.path.join("images", img_file))
-        
-        return {
+        result = {
+            "name": name_without_extension,
             "md_content": full_md_content,
-            "zip_path": zip_path,
+            "zip_path": None,
             "md_file_path": md_file_path,
             "image_dir": local_image_dir
         }
+        
+        # 创建ZIP压缩包
+        if make_zip:
+            # 图片数据仍在内存中，直接写入压缩包，不再从磁盘读回
+            images = [(os.path.basename(image_path), blob) for image_path, blob in image_blobs]
+            self._write_zip(result, images=images)
+        
+        return result
     
-    def _extract_and_save_docx_image(self, shape, image_path):
+    def _get_docx_image_part(self, part, shape):
         """
-        从DOCX文件中提取并保存图片
+        获取DOCX图形对象引用的图片部件
         
         Args:
-            shape: 文档中的图形对象
-            image_path: 保存图片的路径
+            part: 图形所在的文档部件
+            shape: 文档中的图形对象（w:drawing元素）
+            
+        Returns:
+            图片部件，图形不包含图片时返回None
+        """
+        rel_ids = shape.xpath('.//a:blip/@r:embed')
+        if not rel_ids:
+            return None
+        try:
+            return part.related_parts[rel_ids[0]]
+        except KeyError:
+            logger.error(f"找不到图片资源: {rel_ids[0]}")
+            return None
+    
+    def _write_image_blob(self, item):
+        """
+        将图片数据写入文件
+        
+        直接使用os.write写入，跳过缓冲I/O层。
+        
+        Args:
+            item: (保存路径, 图片数据)元组
             
         Returns:
             布尔值，表示是否成功保存图片
         """
+        image_path, blob = item
         try:
-            # 提取图片并保存
-            with open(image_path, 'wb') as f:
-                f.write(shape.blob)
+            fd = os.open(image_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                view = memoryview(blob)
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+            finally:
+                os.close(fd)
             return True
-        except Exception as e:
+        except OSError as e:
             logger.error(f"保存图片失败: {e}")
             return False
     
-    def _process_image(self, file_path, task_id):
+    def _process_image(self, file_path, task_id, make_zip=True, defer_ocr=False):
         """
         处理图片文件
         
         Args:
             file_path: 图片文件路径
             task_id: 任务ID
+            make_zip: 是否生成单文件ZIP压缩包，批量处理时为False
+            defer_ocr: 不立即推理，而是返回待OCR标记，由批量处理统一推理
             
         Returns:
             转换结果信息
@@ -238,60 +589,289 @@ class MinerUWebConverter:
         logger.info(f"处理图片文件: {file_path}")
         
         # 创建临时输出目录
-        name_without_extension = os.path.basename(file_path).split('.')[0]
         task_output_dir = os.path.join(self.output_dir, task_id)
         local_image_dir = os.path.join(task_output_dir, "images")
         FileUtils.ensure_dir(local_image_dir)
         
         # 复制图片到输出目录
         output_image_path = os.path.join(local_image_dir, os.path.basename(file_path))
-        shutil.copy(file_path, output_image_path)
+        FileUtils.fast_copy(file_path, output_image_path)
+        
+        if defer_ocr:
+            return {"ocr_pending": True, "file_path": file_path, "task_id": task_id,
+                    "parse_method": SupportedPdfParseMethod.OCR,
+                    "fallback_image": os.path.basename(file_path)}
         
         # 使用MinerU进行OCR识别
-        img = Image.open(file_path)
-        img_data = None
-        with open(file_path, 'rb') as f:
-            img_data = f.read()
+        img_data = FileUtils.read_bytes(file_path)
         
         # 创建数据集实例
         ds = PymuDocDataset(img_data)
         
         # 执行OCR
-        infer_result = ds.apply(doc_analyze, ocr=True)
+        with _inference_lock:
+            infer_result = ds.apply(doc_analyze, ocr=True)
+        
+        return self._finish_ocr(infer_result, file_path, task_id, make_zip,
+                                fallback_image=os.path.basename(file_path))
+    
+    def _finish_ocr(self, infer_result, file_path, task_id, make_zip=True, fallback_image=None,
+                    parse_method=SupportedPdfParseMethod.OCR):
+        """
+        根据模型推理结果生成Markdown文件
         
-        # 设置文件写入器
+        Args:
+            infer_result: doc_analyze或batch_doc_analyze返回的推理结果
+            file_path: 原始文件路径
+            task_id: 任务ID
+            make_zip: 是否生成单文件ZIP压缩包，批量处理时为False
+            fallback_image: OCR没有提取到文本时在Markdown中引用的图片文件名
+            parse_method: 推理时使用的解析方式（SupportedPdfParseMethod）
+            
+        Returns:
+            转换结果信息
+        """
+        name_without_extension = os.path.basename(file_path).split('.')[0]
+        task_output_dir = os.path.join(self.output_dir, task_id)
+        local_image_dir = os.path.join(task_output_dir, "images")
+        FileUtils.ensure_dir(local_image_dir)
+        
+        # 设置文件写入器（图片目录每个任务唯一，写入器无法跨任务复用，且构造开销很小，因此不做缓存）
         image_writer = FileBasedDataWriter(local_image_dir)
-        md_writer = FileBasedDataWriter(task_output_dir)
         
         # 获取处理结果
-        pipe_result = infer_result.pipe_ocr_mode(image_writer)
+        if parse_method == SupportedPdfParseMethod.TXT:
+            pipe_result = infer_result.pipe_txt_mode(image_writer)
+        else:
+            pipe_result = infer_result.pipe_ocr_mode(image_writer)
         image_dir = "images"
         md_content = pipe_result.get_markdown(image_dir)
         
         # 如果OCR没有提取文本，添加图片Markdown
-        if not md_content.strip():
-            md_content = f"![{name_without_extension}](images/{os.path.basename(file_path)})"
+        if fallback_image and not md_content.strip():
+            md_content = f"![{name_without_extension}](images/{fallback_image})"
         
         # 保存Markdown文件
         md_file_path = os.path.join(task_output_dir, f"{name_without_extension}.md")
         with open(md_file_path, 'w', encoding='utf-8') as f:
             f.write(md_content)
         
-        # 创建ZIP压缩包
-        zip_path = os.path.join(task_output_dir, f"{name_without_extension}.zip")
-        with zipfile.ZipFile(zip_path, 'w') as zipf:
-            # 添加Markdown文件
-            zipf.write(md_file_path, os.path.basename(md_file_path))
-            
-            # 添加图片文件
-            zipf.write(output_image_path, os.path.join("images", os.path.basename(file_path)))
-        
-        return {
+        result = {
+            "name": name_without_extension,
             "md_content": md_content,
-            "zip_path": zip_path,
+            "zip_path": None,
             "md_file_path": md_file_path,
             "image_dir": local_image_dir
         }
+        
+        # 创建ZIP压缩包
+        if make_zip:
+            self._write_zip(result)
+        
+        return result
+    
+    def _batch_ocr(self, pending):
+        """
+        对多个待OCR文件进行批量推理
+        
+        将各文件的页面按解析方式分组，每组凑满BATCH_PAGES页后一次性推理，
+        摊薄模型调用开销，再将推理结果分发回各自的文件生成Markdown。
+        
+        Args:
+            pending: 待OCR标记列表
+            
+        Yields:
+            (原始文件路径, 转换结果信息)
+        """
+        # 解析方式 -> [(待OCR标记, 数据集实例)]
+        groups = {}
+        group_pages = {}
+        for item in pending:
+            try:
+                ds = PymuDocDataset(FileUtils.read_bytes(item["file_path"]))
+                # 工作进程中未分类的文档在这里分类，文本型PDF无需OCR
+                parse_method = item["parse_method"] or ds.classify()
+            except Exception as e:
+                logger.error(f"读取文件失败: {item['file_path']}, {e}")
+                yield item["file_path"], None
+                continue
+            
+            groups.setdefault(parse_method, []).append((item, ds))
+            group_pages[parse_method] = group_pages.get(parse_method, 0) + len(ds)
+            if group_pages[parse_method] >= self.BATCH_PAGES:
+                yield from self._run_ocr_group(groups.pop(parse_method), parse_method)
+                del group_pages[parse_method]
+        
+        for parse_method, group in groups.items():
+            yield from self._run_ocr_group(group, parse_method)
+    
+    def _run_ocr_group(self, group, parse_method):
+        """
+        对一组解析方式相同的文件执行一次批量推理
+        
+        整组推理失败时逐个文件重试，仍然失败的文件记录日志后跳过。
+        
+        Args:
+            group: (待OCR标记, 数据集实例)列表
+            parse_method: 解析方式（SupportedPdfParseMethod）
+            
+        Yields:
+            (原始文件路径, 转换结果信息)，处理失败的文件结果为None
+        """
+        logger.info(f"批量{parse_method.value}推理: {len(group)} 个文件, "
+                    f"{sum(len(ds) for _, ds in group)} 页")
+        try:
+            with _inference_lock:
+                if batch_doc_analyze is not None:
+                    infer_results = batch_doc_analyze([ds for _, ds in group], parse_method.value)
+                else:
+                    ocr = parse_method == SupportedPdfParseMethod.OCR
+                    infer_results = [ds.apply(doc_analyze, ocr=ocr) for _, ds in group]
+        except Exception as e:
+            if len(group) == 1:
+                logger.error(f"模型推理失败，已跳过文件: {group[0][0]['file_path']}, {e}")
+                yield group[0][0]["file_path"], None
+                return
+            
+            logger.error(f"批量推理失败，改为逐个文件推理: {e}")
+            for member in group:
+                yield from self._run_ocr_group([member], parse_method)
+            return
+        
+        for (item, _), infer_result in zip(group, infer_results):
+            try:
+                result = self._finish_ocr(infer_result, item["file_path"], item["task_id"],
+                                          make_zip=False, fallback_image=item["fallback_image"],
+                                          parse_method=parse_method)
+            except Exception as e:
+                logger.error(f"处理项目时出错，已跳过文件: {item['file_path']}, {e}")
+                yield item["file_path"], None
+                continue
+            
+            self._cache_store(item["file_hash"], result)
+            yield item["file_path"], result
+    
+    def _pack(self, result, zip_writer, prefix="", images=None):
+        """
+        将单个文件的转换结果写入ZIP压缩包
+        
+        Args:
+            result: 转换结果信息
+            zip_writer: 已打开的ZipFile对象
+            prefix: 压缩包内的子目录，为空时写入根目录
+            images: 已在内存中的图片 [(文件名, 图片数据)]，提供时直接写入，不再读取图片目录
+        """
+        # 添加Markdown文件，内容已在内存中，无需从磁盘读回
+        zip_writer.writestr(os.path.join(prefix, f"{result['name']}.md"), result["md_content"],
+                            compress_type=zipfile.ZIP_DEFLATED)
+        
+        # 添加图片文件夹
+        if images is not None:
+            for image_name, blob in images:
+                zip_writer.writestr(os.path.join(prefix, "images", image_name), blob,
+                                    compress_type=self._compress_type(image_name))
+            return
+        
+        image_dir = result["image_dir"]
+        # scandir返回的目录项自带文件类型信息，无需再逐个stat
+        with os.scandir(image_dir) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False):
+                    zip_writer.write(entry.path, os.path.join(prefix, "images", entry.name),
+                                     compress_type=self._compress_type(entry.name))
+    
+    def _compress_type(self, file_name):
+        """
+        选择ZIP条目的压缩方式
+        
+        Args:
+            file_name: 文件名
+            
+        Returns:
+            已压缩的图片格式返回ZIP_STORED，其余返回ZIP_DEFLATED
+        """
+        ext = os.path.splitext(file_name)[1].lower()
+        if ext in self.PRECOMPRESSED_IMAGE_EXTS:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+    
+    def _open_zip(self, zip_path):
+        """
+        创建用于写入的ZIP压缩包
+        
+        默认使用快速deflate压缩Markdown等文本，已压缩的图片由_pack按条目直接存储。
+        
+        Args:
+            zip_path: ZIP文件路径
+            
+        Returns:
+            ZipFile对象
+        """
+        return zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1)
+    
+    def _write_zip(self, result, images=None):
+        """
+        为单个文件的转换结果生成ZIP压缩包，并记录到结果信息中
+        
+        Args:
+            result: 转换结果信息
+            images: 已在内存中的图片 [(文件名, 图片数据)]，参见_pack
+            
+        Returns:
+            ZIP文件路径
+        """
+        zip_path = os.path.join(os.path.dirname(result["md_file_path"]), f"{result['name']}.zip")
+        # 先写入临时文件再原子替换，缓存命中时多个请求可能同时为同一结果目录打包
+        tmp_path = f"{zip_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with self._open_zip(tmp_path) as zipf:
+                self._pack(result, zipf, images=images)
+            os.replace(tmp_path, zip_path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        result["zip_path"] = zip_path
+        return zip_path
+    
+    def convert(self, file_path, make_zip=True, defer_ocr=False):
+        """
+        转换单个文件
+        
+        Args:
+            file_path: 文件路径
+            make_zip: 是否生成单文件ZIP压缩包，批量处理时为False
+            defer_ocr: 需要OCR的文件不立即推理，返回待OCR标记（包含ocr_pending字段）
+            
+        Returns:
+            转换结果信息或待OCR标记，不支持的文件类型返回None
+        """
+        # 根据文件类型选择处理方法
+        handler = self._handlers.get(os.path.splitext(file_path)[1].lower())
+        if handler is None:
+            return None
+        
+        # 相同内容的文件已转换过时直接返回缓存结果
+        file_hash = FileUtils.file_sha256(file_path)
+        result = self._cache_lookup(file_hash, file_path)
+        if result is not None:
+            logger.info(f"命中转换缓存: {file_path}")
+            if make_zip and result["zip_path"] is None:
+                self._write_zip(result)
+                self._cache_store(file_hash, result)
+            return result
+        
+        # 生成唯一任务ID
+        task_id = f"task_{uuid.uuid4().hex}"
+        result = handler(file_path, task_id, make_zip, defer_ocr)
+        
+        # 待OCR的文件在批量推理完成后再写入缓存
+        if result.get("ocr_pending"):
+            result["file_hash"] = file_hash
+            return result
+        
+        self._cache_store(file_hash, result)
+        return result
     
     def process_file(self, file_path):
         """
@@ -303,19 +883,8 @@ class MinerUWebConverter:
         Returns:
             处理结果，包括Markdown预览和下载链接
         """
-        # 生成唯一任务ID
-        task_id = f"task_{int(time.time())}"
-        
-        # 根据文件类型执行不同的处理
-        file_ext = os.path.splitext(file_path)[1].lower()
-        
-        if file_ext == '.pdf':
-            result = self._process_pdf(file_path, task_id)
-        elif file_ext in ['.doc', '.docx']:
-            result = self._process_docx(file_path, task_id)
-        elif file_ext in ['.jpg', '.jpeg', '.png', '.gif']:
-            result = self._process_image(file_path, task_id)
-        else:
+        result = self.convert(file_path)
+        if result is None:
             return "不支持的文件类型", None
         
         return result["md_content"], result["zip_path"]
@@ -331,48 +900,71 @@ class MinerUWebConverter:
             包含所有处理结果的ZIP文件路径
         """
         # 生成批处理任务ID
-        task_id = f"batch_{int(time.time())}"
+        task_id = f"batch_{uuid.uuid4().hex}"
         task_output_dir = os.path.join(self.output_dir, task_id)
         FileUtils.ensure_dir(task_output_dir)
         
         # 创建进度跟踪器
         progress = ProgressTracker(len(file_paths), "批量处理文件")
         
-        # 定义处理回调函数
+        # 定义处理回调函数，待OCR的文件在批量推理完成后才计入进度
         def process_callback(file_path, result):
+            if result is not None and result.get("ocr_pending"):
+                return
             progress.update()
             logger.info(f"已处理文件: {file_path}, 进度: {progress.get_progress()['percentage']:.2f}%")
         
-        # 使用并行处理器处理文件
+        # 第一阶段：使用并行处理器处理文件（进程池要求处理函数可pickle，因此使用模块级函数）
+        # DOCX和带文本层的PDF直接完成转换，需要OCR的文件只返回待OCR标记
+        # 结果按完成顺序逐个产出，先完成的文件可以立即打包
         results = self.processor.process_items(
             file_paths,
-            self.process_file,
+            partial(convert_file, output_dir=self.output_dir),
             process_callback
         )
         
-        # 创建汇总ZIP包
+        # 创建汇总ZIP包，每个文件的结果直接写入，使用文件名作为子目录
         batch_zip_path = os.path.join(task_output_dir, "batch_results.zip")
-        with zipfile.ZipFile(batch_zip_path, 'w') as batch_zip:
-            for i, result in enumerate(results):
-                if isinstance(result, tuple) and len(result) == 2 and result[1]:
-                    md_content, zip_path = result
-                    if os.path.exists(zip_path):
-                        # 解压单个文件的ZIP到临时目录
-                        with tempfile.TemporaryDirectory() as temp_dir:
-                            with zipfile.ZipFile(zip_path, 'r') as file_zip:
-                                file_zip.extractall(temp_dir)
-                            
-                            # 将文件添加到汇总ZIP，使用文件名作为子目录
-                            base_name = os.path.basename(zip_path).split('.')[0]
-                            for root, _, files in os.walk(temp_dir):
-                                for file in files:
-                                    file_path = os.path.join(root, file)
-                                    rel_path = os.path.relpath(file_path, temp_dir)
-                                    batch_zip.write(file_path, os.path.join(base_name, rel_path))
+        pending = []
+        with self._open_zip(batch_zip_path) as batch_zip:
+            for result in results:
+                if result is None:
+                    continue
+                if result.get("ocr_pending"):
+                    pending.append(result)
+                    continue
+                self._pack(result, batch_zip, prefix=result["name"])
+            
+            # 第二阶段：汇总所有待OCR文件的页面进行批量推理，再按文件分发结果并打包
+            for file_path, result in self._batch_ocr(pending):
+                # 处理失败的文件同样计入进度
+                process_callback(file_path, result)
+                if result is not None:
+                    self._pack(result, batch_zip, prefix=result["name"])
         
         return batch_zip_path
 
 
+def convert_file(file_path, output_dir="output"):
+    """
+    进程池工作函数：在工作进程中转换单个文件
+    
+    每个工作进程按输出目录缓存一个转换器实例，避免重复初始化。
+    
+    Args:
+        file_path: 文件路径
+        output_dir: 输出目录
+        
+    Returns:
+        转换结果信息（不生成单文件ZIP压缩包），需要OCR的文件返回待OCR标记
+    """
+    converter = _worker_converters.get(output_dir)
+    if converter is None:
+        converter = MinerUWebConverter(output_dir)
+        _worker_converters[output_dir] = converter
+    return converter.convert(file_path, make_zip=False, defer_ocr=True)
+
+
 def create_ui():
     """创建Gradio Web UI界面"""
     
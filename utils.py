@@ -7,73 +7,145 @@ MinerU Web UI 工具类
 """
 
 import os
+import mmap
+import atexit
+import shutil
+import hashlib
+import itertools
 import threading
-from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Any, Callable, Optional
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Callable, Iterator, Optional
 from loguru import logger
 
 
 class ParallelProcessor:
-    """并行处理器类，支持并行处理文件以提高效率"""
+    """并行处理器类，使用进程池并行处理文件以绕过GIL，充分利用多核CPU"""
     
     def __init__(self, max_workers: int = None):
         """
         初始化并行处理器
         
+        进程池在首次处理时创建并一直保留，工作进程及其中已导入的模块、
+        已初始化的转换器可以在多次批量处理之间复用，程序退出时关闭。
+        
         Args:
-            max_workers: 最大工作线程数，默认为None（由系统决定）
+            max_workers: 最大工作进程数，默认为None（使用CPU核心数）
         """
-        # 如果未指定，使用CPU核心数的2倍
+        # 如果未指定，使用CPU核心数（解析任务为CPU/GPU密集型，多开进程无益）
         if max_workers is None:
-            import multiprocessing
-            max_workers = multiprocessing.cpu_count() * 2
+            max_workers = multiprocessing.cpu_count()
             
         self.max_workers = max_workers
-        logger.info(f"初始化并行处理器，最大工作线程数: {max_workers}")
+        # 使用spawn方式启动子进程，避免fork继承CUDA上下文和模型状态
+        self.mp_context = multiprocessing.get_context("spawn")
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        atexit.register(self.shutdown)
+        logger.info(f"初始化并行处理器，最大工作进程数: {max_workers}")
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """
+        获取进程池，首次调用时创建
+        
+        工作进程按需启动，任务较少时不会启动全部max_workers个进程。
+        
+        Returns:
+            ProcessPoolExecutor实例
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=self.mp_context)
+            return self._executor
+    
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        """
+        丢弃已损坏的进程池（如工作进程被系统终止），下次提交任务时重新创建
+        
+        Args:
+            executor: 已损坏的进程池
+        """
+        with self._executor_lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+    
+    def shutdown(self) -> None:
+        """关闭进程池并等待工作进程退出"""
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
     
     def process_items(self, 
                       items: List[Any], 
                       process_func: Callable[[Any], Any],
-                      callback: Optional[Callable[[Any, Any], None]] = None) -> List[Any]:
+                      callback: Optional[Callable[[Any, Any], None]] = None) -> Iterator[Any]:
         """
-        并行处理多个项目
+        并行处理多个项目，按完成顺序逐个产出结果
+        
+        同一时间最多只有2倍工作进程数的任务在途，处理完一个再提交下一个，
+        避免大批量任务一次性提交占用过多内存。
         
         Args:
             items: 需要处理的项目列表
-            process_func: 处理单个项目的函数，接收一个项目作为参数
+            process_func: 处理单个项目的函数，接收一个项目作为参数。
+                必须是可以被pickle的模块级函数（或其functools.partial）
             callback: 回调函数，在每个项目处理完成后调用，接收原始项目和处理结果
             
-        Returns:
-            处理结果列表
+        Yields:
+            处理结果，顺序为完成顺序；处理出错的项目会被记录并跳过
         """
-        results = []
+        if not items:
+            return
         
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 创建futures
-            future_to_item = {
-                executor.submit(process_func, item): item for item in items
-            }
-            
-            # 处理结果
-            for future in future_to_item:
+        max_workers = min(self.max_workers, len(items))
+        pending_items = iter(items)
+        future_to_item = {}
+        
+        def submit_next(count):
+            for item in itertools.islice(pending_items, count):
+                executor = self._get_executor()
+                future_to_item[executor.submit(process_func, item)] = (item, executor)
+        
+        # 先填满提交窗口
+        submit_next(2 * max_workers)
+        
+        while future_to_item:
+            done, _ = wait(future_to_item, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, executor = future_to_item.pop(future)
                 try:
                     result = future.result()
-                    results.append(result)
-                    
-                    # 如果有回调函数，调用它
-                    if callback:
-                        item = future_to_item[future]
-                        callback(item, result)
-                        
+                except BrokenProcessPool as e:
+                    # 进程池损坏后在途的任务都会失败，之后提交的任务使用新的进程池
+                    logger.error(f"工作进程异常退出，已跳过项目: {item}, {e}")
+                    self._discard_executor(executor)
+                    continue
                 except Exception as e:
                     logger.error(f"处理项目时出错: {e}")
-        
-        return results
+                    continue
+                
+                # 如果有回调函数，调用它
+                if callback:
+                    callback(item, result)
+                yield result
+            
+            # 每完成一个任务补充一个新任务
+            submit_next(len(done))
 
 
 class FileUtils:
     """文件操作工具类"""
     
+    # Linux ioctl FICLONE，在btrfs/XFS等写时复制文件系统上创建共享数据块的副本
+    _FICLONE = 0x40049409
+    
+    # 文件名中不合法字符到下划线的映射表
+    _ILLEGAL_CHARS_TRANS = str.maketrans({char: '_' for char in '/\\:*?"<>|'})
+    
     @staticmethod
     def get_file_type(file_path: str) -> str:
         """
@@ -96,6 +168,102 @@ class FileUtils:
         else:
             return 'unknown'
     
+    @staticmethod
+    def file_sha256(file_path: str) -> str:
+        """
+        计算文件内容的SHA-256摘要
+        
+        通过mmap映射文件，由操作系统按需换入页面，避免额外分配读取缓冲区。
+        
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            十六进制格式的摘要字符串
+        """
+        with open(file_path, 'rb') as f:
+            # 空文件无法mmap
+            if os.fstat(f.fileno()).st_size == 0:
+                return hashlib.sha256(b'').hexdigest()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.sha256(mm).hexdigest()
+    
+    @staticmethod
+    def read_bytes(file_path: str) -> bytes:
+        """
+        通过mmap读取文件的全部内容
+        
+        Args:
+            file_path: 文件路径
+            
+        Returns:
+            文件内容
+        """
+        with open(file_path, 'rb') as f:
+            # 空文件无法mmap
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return bytes(mm)
+    
+    @staticmethod
+    def fast_copy(src: str, dst: str) -> str:
+        """
+        复制文件内容，尽量避免数据经过用户空间
+        
+        依次尝试copy_file_range、FICLONE（reflink）和sendfile，
+        均不可用时回退到shutil.copyfile。
+        
+        Args:
+            src: 源文件路径
+            dst: 目标文件路径
+            
+        Returns:
+            目标文件路径
+        """
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            in_fd, out_fd = fsrc.fileno(), fdst.fileno()
+            size = os.fstat(in_fd).st_size
+            
+            for copy in (FileUtils._copy_file_range, FileUtils._reflink, FileUtils._sendfile):
+                try:
+                    copy(in_fd, out_fd, size)
+                    return dst
+                except (OSError, AttributeError, ImportError):
+                    # 当前方式不受支持，重置文件状态后尝试下一种
+                    os.lseek(in_fd, 0, os.SEEK_SET)
+                    os.ftruncate(out_fd, 0)
+                    os.lseek(out_fd, 0, os.SEEK_SET)
+        
+        shutil.copyfile(src, dst)
+        return dst
+    
+    @staticmethod
+    def _copy_file_range(in_fd: int, out_fd: int, size: int) -> None:
+        """在内核中复制文件数据（Linux 4.5+）"""
+        copied = 0
+        while copied < size:
+            n = os.copy_file_range(in_fd, out_fd, size - copied, copied, copied)
+            if n == 0:
+                raise OSError("copy_file_range提前结束")
+            copied += n
+    
+    @staticmethod
+    def _reflink(in_fd: int, out_fd: int, size: int) -> None:
+        """在写时复制文件系统上克隆文件数据块"""
+        import fcntl
+        fcntl.ioctl(out_fd, FileUtils._FICLONE, in_fd)
+    
+    @staticmethod
+    def _sendfile(in_fd: int, out_fd: int, size: int) -> None:
+        """使用sendfile在内核中复制文件数据"""
+        copied = 0
+        while copied < size:
+            n = os.sendfile(out_fd, in_fd, copied, size - copied)
+            if n == 0:
+                raise OSError("sendfile提前结束")
+            copied += n
+    
     @staticmethod
     def ensure_dir(directory: str) -> str:
         """
@@ -107,8 +275,8 @@ class FileUtils:
         Returns:
             目录路径
         """
-        if not os.path.exists(directory):
-            os.makedirs(directory, exist_ok=True)
+        # exist_ok=True已能处理目录已存在和并发创建的情况，无需先检查
+        os.makedirs(directory, exist_ok=True)
         return directory
     
     @staticmethod
@@ -122,11 +290,8 @@ class FileUtils:
         Returns:
             清理后的文件名
         """
-        # 移除不合法字符
-        illegal_chars = ['/', '\\', ':', '*', '?', '"', '<', '>', '|']
-        for char in illegal_chars:
-            filename = filename.replace(char, '_')
-        return filename
+        # 将不合法字符替换为下划线，translate只需遍历一次字符串
+        return filename.translate(FileUtils._ILLEGAL_CHARS_TRANS)
 
 
 class ProgressTracker:
@@ -141,9 +306,17 @@ class ProgressTracker:
             description: 进度描述
         """
         self.total = total
-        self.current = 0
         self.description = description
-        self.lock = threading.Lock()
+        self._current = 0
+        # 上次输出日志时的整数百分比，只在跨过整数百分比时输出日志
+        self._logged_percentage = -1
+        # 保证计数和发布进度是一个整体，批量处理的回调都在同一线程中执行，锁不会产生竞争
+        self._lock = threading.Lock()
+    
+    @property
+    def current(self) -> int:
+        """当前已完成的任务数"""
+        return self._current
         
     def update(self, increment: int = 1) -> Dict[str, Any]:
         """
@@ -155,19 +328,20 @@ class ProgressTracker:
         Returns:
             包含进度信息的字典
         """
-        with self.lock:
-            self.current += increment
-            progress = min(self.current / self.total, 1.0)
-            percentage = progress * 100
+        with self._lock:
+            self._current += increment
+            current = self._current
             
-            logger.info(f"{self.description}: {percentage:.2f}% ({self.current}/{self.total})")
-            
-            return {
-                "current": self.current,
-                "total": self.total,
-                "progress": progress,
-                "percentage": percentage
-            }
+            info = self._progress_info(current)
+            percentage = int(info["percentage"])
+            should_log = percentage > self._logged_percentage
+            if should_log:
+                self._logged_percentage = percentage
+        
+        if should_log:
+            logger.info(f"{self.description}: {info['percentage']:.2f}% ({current}/{self.total})")
+        
+        return info
     
     def get_progress(self) -> Dict[str, Any]:
         """
@@ -176,13 +350,25 @@ class ProgressTracker:
         Returns:
             包含进度信息的字典
         """
-        with self.lock:
-            progress = min(self.current / self.total, 1.0)
-            percentage = progress * 100
+        # 只读取已发布的计数，单个属性的读取无需加锁
+        return self._progress_info(self._current)
+    
+    def _progress_info(self, current: int) -> Dict[str, Any]:
+        """
+        根据已完成的任务数生成进度信息
+        
+        Args:
+            current: 已完成的任务数
             
-            return {
-                "current": self.current,
-                "total": self.total,
-                "progress": progress,
-                "percentage": percentage
-            } 
\ No newline at end of file
+        Returns:
+            包含进度信息的字典
+        """
+        progress = min(current / self.total, 1.0)
+        percentage = progress * 100
+        
+        return {
+            "current": current,
+            "total": self.total,
+            "progress": progress,
+            "percentage": percentage
+        }